@@ -15,6 +15,8 @@
 
 """Base classes for Flask-based API and web request handlers."""
 
+import functools
+import importlib
 import json
 import logging
 import os
@@ -22,7 +24,16 @@ import re
 from dataclasses import dataclass
 from dataclasses import field as dc_field
 from datetime import datetime
-from typing import Any, NoReturn, Optional, Type, TypeVar
+from types import MappingProxyType
+from typing import (
+    Any,
+    Mapping,
+    MutableMapping,
+    NoReturn,
+    Optional,
+    Type,
+    TypeVar,
+)
 
 import flask
 import flask.views
@@ -31,6 +42,9 @@ import werkzeug.exceptions
 from flask import render_template, session
 from flask_cors import CORS
 from google.cloud import ndb  # type: ignore
+from werkzeug.routing import Map, Rule
+from werkzeug.routing.exceptions import NoMatch
+from werkzeug.routing.matcher import StateMachineMatcher
 
 import settings
 from api import api_specs
@@ -61,6 +75,10 @@ M = TypeVar('M', bound=ndb.Model)
 class BaseHandler(flask.views.MethodView):
     """Base handler class for requests."""
 
+    # Handlers keep no per-request state on self, so as_view() makes one
+    # instance that serves every request instead of one per request.
+    init_every_request = False
+
     @property
     def request(self):
         """Get the current request."""
@@ -935,18 +953,211 @@ def get_spa_template_data(handler_obj, defaults):
     return {}  # no handler_data needed to be returned
 
 
-@dataclass
+# Shared by every Route that has no defaults, which is most of them.
+NO_DEFAULTS: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(slots=True, frozen=True)
 class Route:
-    """Represents a routing configuration for the application."""
+    """Represents a routing configuration for the application.
+
+    handler_class may also be a dotted 'module.ClassName' string naming a
+    FlaskHandler subclass, which is then imported on its first request.
+    """
 
     path: str
-    handler_class: Type[BaseHandler] = SPAHandler
-    defaults: dict[str, Any] = dc_field(default_factory=dict)
+    handler_class: Type[BaseHandler] | str = SPAHandler
+    defaults: Mapping[str, Any] = dc_field(default_factory=lambda: NO_DEFAULTS)
+
+
+# A path segment that is exactly one int or string route parameter.
+ROUTE_PARAM_RE = re.compile(r'^<(?:(int|string):)?(\w+)>$')
+
+
+@dataclass(slots=True)
+class RouteNode:
+    """One path segment in a trie of dynamic routes for one HTTP method."""
+
+    static: dict[str, 'RouteNode'] = dc_field(default_factory=dict)
+    int_child: Optional['RouteNode'] = None
+    string_child: Optional['RouteNode'] = None
+    # The rule that ends at this node, with the names of its params in order.
+    rule: Optional[Rule] = None
+    param_names: tuple[str, ...] = ()
+
+
+class RouteMatcher(StateMachineMatcher):
+    """Werkzeug matcher that resolves our usual routes with dict lookups.
+
+    Rules without params are kept in a dict keyed by (path, method), and
+    rules whose params are whole int or string segments are kept in a trie
+    of path segments per method, so matching costs O(path depth) rather than
+    a walk of werkzeug's regex transitions.  The first level of each trie
+    buckets rules by their first path segment, and recent trie matches are
+    kept in an LRU cache because most traffic hits a few URLs.  Any other
+    rule, and any request that the fast path cannot resolve, falls through to
+    werkzeug's state machine so that redirects, 404s, and 405s behave exactly
+    as before, except that a path whose first segment begins no rule at all,
+    such as a probe for /.env or /wp-login.php, is a 404 without that walk.
+    """
+
+    def __init__(self, merge_slashes: bool) -> None:
+        """Initialize empty lookups alongside werkzeug's state machine."""
+        super().__init__(merge_slashes)
+        self.static_rules: dict[tuple[str, str], Rule] = {}
+        self.dynamic_roots: dict[str, RouteNode] = {}
+        # The first path segment of every rule, or None if any rule starts
+        # with a param, in which case no path can be rejected this way.
+        self.first_segments: Optional[set[str]] = set()
+        self._cached_match_dynamic = functools.lru_cache(
+            maxsize=settings.ROUTE_CACHE_SIZE
+        )(self._match_dynamic)
+
+    def add(self, rule: Rule) -> None:
+        """Add a rule to werkzeug's state machine and to our lookups."""
+        super().add(rule)
+        self._cached_match_dynamic.cache_clear()
+        first_segment = rule.rule.split('/', 2)[1]
+        if '<' in first_segment:
+            self.first_segments = None
+        elif self.first_segments is not None:
+            self.first_segments.add(first_segment)
+        if (
+            rule.alias
+            or rule.websocket
+            or rule.redirect_to is not None
+            or rule.subdomain
+            or rule.host
+            or rule.methods is None
+        ):
+            return
+
+        if '<' not in rule.rule:
+            for method in rule.methods:
+                self.static_rules.setdefault((rule.rule, method), rule)
+            return
+
+        # Each segment is (None, text) or (converter, param name).
+        segments: list[tuple[str | None, str]] = []
+        for part in rule.rule.split('/')[1:]:
+            param_match = ROUTE_PARAM_RE.match(part)
+            if param_match:
+                segments.append(
+                    (param_match.group(1) or 'string', param_match.group(2))
+                )
+            elif '<' in part:
+                return  # Other converters are left to werkzeug.
+            else:
+                segments.append((None, part))
+
+        param_names = tuple(name for kind, name in segments if kind is not None)
+        for method in rule.methods:
+            node = self.dynamic_roots.setdefault(method, RouteNode())
+            for kind, text in segments:
+                if kind is None:
+                    node = node.static.setdefault(text, RouteNode())
+                elif kind == 'int':
+                    node.int_child = node.int_child or RouteNode()
+                    node = node.int_child
+                else:
+                    node.string_child = node.string_child or RouteNode()
+                    node = node.string_child
+            if node.rule is None:
+                node.rule = rule
+                node.param_names = param_names
+
+    def match(
+        self, domain: str, path: str, method: str, websocket: bool
+    ) -> tuple[Rule, MutableMapping[str, Any]]:
+        """Match a request path, trying our lookups before werkzeug's."""
+        if not websocket and not domain:
+            rule = self.static_rules.get((path, method))
+            if rule is not None:
+                return rule, dict(rule.defaults or {})
+            result = self._cached_match_dynamic(path, method)
+            if result is not None:
+                rule, values = result
+                return rule, dict(values)
+        if self.first_segments is not None:
+            first_segment = path.split('/', 2)[1] if path else ''
+            if first_segment and first_segment not in self.first_segments:
+                raise NoMatch(set(), False)
+        return super().match(domain, path, method, websocket)
+
+    def _match_dynamic(
+        self, path: str, method: str
+    ) -> tuple[Rule, dict[str, Any]] | None:
+        """Walk the trie, preferring static segments as werkzeug does."""
+        node = self.dynamic_roots.get(method)
+        if node is None:
+            return None
+        values: list[Any] = []
+        segments = path.split('/')
+        i, depth = 1, len(segments)
+        while i < depth:
+            segment = segments[i]
+            child = node.static.get(segment)
+            if child is None:
+                if node.int_child is not None and segment.isdecimal():
+                    child = node.int_child
+                    values.append(int(segment))
+                elif node.string_child is not None and segment:
+                    child = node.string_child
+                    values.append(segment)
+                else:
+                    return None
+            node = child
+            i += 1
+
+        rule = node.rule
+        if rule is None:
+            return None
+        result = dict(zip(node.param_names, values))
+        if rule.defaults:
+            result.update(rule.defaults)
+        return rule, result
+
+
+class RouteMap(Map):
+    """URL map that matches requests with a RouteMatcher."""
+
+    def __init__(self, rules=None, **kwargs) -> None:
+        """Swap in our matcher before any rules are added."""
+        super().__init__(**kwargs)
+        self._matcher = RouteMatcher(self.merge_slashes)
+        for rulefactory in rules or ():
+            self.add(rulefactory)
+
+
+class FlaskApp(flask.Flask):
+    """Flask app that uses a RouteMap for its URL map."""
+
+    url_map_class = RouteMap
+
+
+def lazy_view(handler_path: str):
+    """Make a view that imports its FlaskHandler on the first request.
+
+    Cron, task, and script handlers are registered this way so that instances
+    that only serve user traffic never pay to import their modules.
+    """
+    module_name, class_name = handler_path.rsplit('.', 1)
+    loaded_view = None
+
+    def view(**kwargs):
+        nonlocal loaded_view
+        if loaded_view is None:
+            module = importlib.import_module(module_name)
+            loaded_view = getattr(module, class_name).as_view(class_name)
+        return loaded_view(**kwargs)
+
+    view.methods = FlaskHandler.methods  # type: ignore[attr-defined]
+    return view
 
 
 def FlaskApplication(import_name, routes, pattern_base='', debug=False):
     """Make a Flask app and add routes and handlers that work like webapp2."""
-    app = flask.Flask(
+    app = FlaskApp(
         import_name, template_folder=settings.get_flask_template_path()
     )
     app.original_wsgi_app = app.wsgi_app  # Only for unit tests.
@@ -962,11 +1173,16 @@ def FlaskApplication(import_name, routes, pattern_base='', debug=False):
     app.permanent_session_lifetime = xsrf.REFRESH_TOKEN_TIMEOUT_SEC
 
     for i, route in enumerate(routes):
-        classname = route.handler_class.__name__
+        if isinstance(route.handler_class, str):
+            classname = route.handler_class.rsplit('.', 1)[1]
+            view_func = lazy_view(route.handler_class)
+        else:
+            classname = route.handler_class.__name__
+            view_func = route.handler_class.as_view(classname)
         app.add_url_rule(
             pattern_base + route.path,
             endpoint=f'{classname}{i}',  # We don't use it, but it must be unique.
-            view_func=route.handler_class.as_view(classname),
+            view_func=view_func,
             defaults=route.defaults,
         )
 
@@ -15,12 +15,14 @@
 """Tests for the basehandlers module, verifying request handling, permissions, and responses."""
 
 import testing_config  # isort: skip  # Must be imported before the module under test.
+import importlib
 import json
 from unittest import mock
 
 import flask
 import flask.views
 import werkzeug.exceptions  # Flask HTTP stuff.
+import werkzeug.routing
 
 import settings
 
@@ -1739,3 +1741,250 @@ class FlaskApplicationTests(testing_config.CustomTestCase):
             actual_response = test_app.full_dispatch_request()
 
         self.assertNotIn('Access-Control-Allow-Origin', actual_response.headers)
+
+
+class AsViewTests(testing_config.CustomTestCase):
+    """Tests for the views made from our handler classes."""
+
+    def test_as_view__one_instance(self):
+        """A handler is constructed once, not once per request."""
+        with mock.patch.object(
+            basehandlers.WarmupHandler,
+            '__init__',
+            autospec=True,
+            return_value=None,
+        ) as mock_init:
+            view = basehandlers.WarmupHandler.as_view('WarmupHandler')
+            with test_app.test_request_context('/_ah/warmup'):
+                self.assertEqual(('OK', 200), view())
+                self.assertEqual(('OK', 200), view())
+
+        mock_init.assert_called_once()
+
+
+class LazyViewTests(testing_config.CustomTestCase):
+    """Tests for views whose handler is imported on the first request."""
+
+    def test_lazy_view(self):
+        """The handler module is imported once, when first needed."""
+        view = basehandlers.lazy_view('framework.basehandlers.WarmupHandler')
+        self.assertEqual(basehandlers.FlaskHandler.methods, view.methods)
+
+        with mock.patch(
+            'importlib.import_module', wraps=importlib.import_module
+        ) as mock_import:
+            with test_app.test_request_context('/_ah/warmup'):
+                self.assertEqual(('OK', 200), view())
+                self.assertEqual(('OK', 200), view())
+
+        mock_import.assert_called_once_with('framework.basehandlers')
+
+
+class RouteTests(testing_config.CustomTestCase):
+    """Tests for the Route dataclass."""
+
+    def test_defaults__shared_when_empty(self):
+        """Routes without defaults share one read-only mapping."""
+        route_1 = Route('/a')
+        route_2 = Route('/b', TestableFlaskHandler)
+        self.assertIs(basehandlers.NO_DEFAULTS, route_1.defaults)
+        self.assertIs(route_1.defaults, route_2.defaults)
+        with self.assertRaises(TypeError):
+            route_1.defaults['require_signin'] = True  # type: ignore
+
+    def test_frozen(self):
+        """Routes cannot be changed after the route table is built."""
+        route = Route('/a', defaults={'require_signin': True})
+        with self.assertRaises(AttributeError):
+            route.path = '/b'  # type: ignore
+        self.assertFalse(hasattr(route, '__dict__'))
+
+
+class RouteMatcherTests(testing_config.CustomTestCase):
+    """Tests for the dict and trie lookups in RouteMatcher."""
+
+    def setUp(self):
+        """Set up the same rules in a RouteMap and a plain werkzeug Map."""
+        self.rules = [
+            ('/features', {'GET'}, None),
+            ('/myfeatures', {'GET'}, {'require_signin': True}),
+            ('/api/v0/features/<int:feature_id>', {'GET', 'PATCH'}, None),
+            ('/api/v0/features/create', {'POST'}, None),
+            (
+                '/api/v0/features/<int:feature_id>/votes/<int:gate_id>',
+                {'GET', 'POST'},
+                None,
+            ),
+            ('/reports/external_reviews/<reviewer>', {'GET'}, None),
+            ('/static/<path:filename>', {'GET'}, None),
+        ]
+        self.route_map = self.make_map(basehandlers.RouteMap)
+        self.werkzeug_map = self.make_map(werkzeug.routing.Map)
+
+    def make_map(self, map_class):
+        """Make a URL map of the given class with our test rules."""
+        return map_class(
+            [
+                werkzeug.routing.Rule(
+                    path, endpoint=path, methods=methods, defaults=defaults
+                )
+                for path, methods, defaults in self.rules
+            ]
+        )
+
+    def match(self, url_map, path, method='GET'):
+        """Return the matched endpoint and values, or the HTTP error type."""
+        adapter = url_map.bind('localhost', path_info=path)
+        try:
+            rule, values = adapter.match(method=method, return_rule=True)
+            return rule.endpoint, values
+        except werkzeug.exceptions.HTTPException as e:
+            return type(e)
+
+    def test_flask_application__uses_route_map(self):
+        """Our app matches URLs with a RouteMatcher."""
+        self.assertIsInstance(test_app.url_map, basehandlers.RouteMap)
+        self.assertIsInstance(
+            test_app.url_map._matcher, basehandlers.RouteMatcher
+        )
+
+    def test_add__static(self):
+        """Rules without params are looked up by (path, method)."""
+        matcher = self.route_map._matcher
+        self.assertEqual(
+            '/features', matcher.static_rules['/features', 'GET'].endpoint
+        )
+        self.assertEqual(
+            '/features', matcher.static_rules['/features', 'HEAD'].endpoint
+        )
+        self.assertNotIn(('/features', 'POST'), matcher.static_rules)
+
+    def test_add__dynamic(self):
+        """Rules with whole-segment int or string params go in the tries."""
+        roots = self.route_map._matcher.dynamic_roots
+        self.assertEqual({'GET', 'HEAD', 'POST', 'PATCH'}, set(roots))
+        features = roots['GET'].static['api'].static['v0'].static['features']
+        self.assertNotIn('create', features.static)
+        self.assertEqual(('feature_id',), features.int_child.param_names)
+        reviews = roots['GET'].static['reports'].static['external_reviews']
+        self.assertEqual(('reviewer',), reviews.string_child.param_names)
+        self.assertNotIn('static', roots['GET'].static)
+
+    def test_add__by_method(self):
+        """Each method's trie only has the rules that accept that method."""
+        roots = self.route_map._matcher.dynamic_roots
+        self.assertNotIn('reports', roots['POST'].static)
+        self.assertNotIn('reports', roots['PATCH'].static)
+        features = roots['PATCH'].static['api'].static['v0'].static['features']
+        self.assertIsNotNone(features.int_child.rule)
+        self.assertNotIn('votes', features.int_child.static)
+
+    def test_match__fast_path(self):
+        """Common paths resolve without werkzeug's state machine."""
+        with mock.patch(
+            'werkzeug.routing.matcher.StateMachineMatcher.match'
+        ) as mock_match:
+            self.assertEqual(
+                ('/myfeatures', {'require_signin': True}),
+                self.match(self.route_map, '/myfeatures'),
+            )
+            self.assertEqual(
+                (
+                    '/api/v0/features/<int:feature_id>/votes/<int:gate_id>',
+                    {'feature_id': 12, 'gate_id': 34},
+                ),
+                self.match(self.route_map, '/api/v0/features/12/votes/34'),
+            )
+            self.assertEqual(
+                ('/reports/external_reviews/<reviewer>', {'reviewer': 'tag'}),
+                self.match(self.route_map, '/reports/external_reviews/tag'),
+            )
+        mock_match.assert_not_called()
+
+    def test_match__unknown_first_segment(self):
+        """Paths that no rule could match are 404s without werkzeug."""
+        with mock.patch(
+            'werkzeug.routing.matcher.StateMachineMatcher.match'
+        ) as mock_match:
+            for path in ['/.env', '/.git/config', '/wp-login.php']:
+                self.assertEqual(
+                    werkzeug.exceptions.NotFound,
+                    self.match(self.route_map, path),
+                )
+        mock_match.assert_not_called()
+
+        # Known first segments still get werkzeug's redirects and 405s.
+        self.assertEqual(
+            werkzeug.routing.RequestRedirect,
+            self.match(self.route_map, '/api//v0/features/12'),
+        )
+        self.assertEqual(
+            werkzeug.exceptions.MethodNotAllowed,
+            self.match(self.route_map, '/features', method='DELETE'),
+        )
+
+    def test_add__param_first_segment(self):
+        """A rule that starts with a param turns off first segment checks."""
+        self.route_map.add(
+            werkzeug.routing.Rule('/<page>', endpoint='page', methods={'GET'})
+        )
+        self.assertIsNone(self.route_map._matcher.first_segments)
+        self.assertEqual(
+            ('page', {'page': 'wp-login.php'}),
+            self.match(self.route_map, '/wp-login.php'),
+        )
+
+    def test_match__cached(self):
+        """Repeated dynamic matches come from the cache, as fresh dicts."""
+        matcher = self.route_map._matcher
+        first = self.match(self.route_map, '/api/v0/features/12')
+        first[1]['feature_id'] = 99
+        second = self.match(self.route_map, '/api/v0/features/12')
+
+        self.assertEqual(
+            ('/api/v0/features/<int:feature_id>', {'feature_id': 12}), second
+        )
+        self.assertEqual(1, matcher._cached_match_dynamic.cache_info().hits)
+
+    def test_add__clears_cache(self):
+        """A cached miss does not hide a rule that is added later."""
+        self.assertEqual(
+            werkzeug.exceptions.NotFound,
+            self.match(self.route_map, '/guide/edit/1'),
+        )
+        self.route_map.add(
+            werkzeug.routing.Rule(
+                '/guide/edit/<int:feature_id>', endpoint='edit', methods={'GET'}
+            )
+        )
+        self.assertEqual(
+            ('edit', {'feature_id': 1}),
+            self.match(self.route_map, '/guide/edit/1'),
+        )
+
+    def test_match__same_as_werkzeug(self):
+        """Matches, redirects, 404s, and 405s are unchanged."""
+        paths = [
+            '/features',
+            '/features/',
+            '//features',
+            '/myfeatures',
+            '/api/v0/features/123',
+            '/api/v0/features/abc',
+            '/api/v0/features/create',
+            '/api/v0/features/12/votes/34',
+            '/api/v0/features/12/votes/',
+            '/api//v0/features/12',
+            '/reports/external_reviews/',
+            '/reports/external_reviews/tag',
+            '/static/js/app.js',
+            '/.env',
+            '/',
+        ]
+        for path in paths:
+            for method in ('GET', 'HEAD', 'POST', 'PATCH'):
+                with self.subTest(path=path, method=method):
+                    self.assertEqual(
+                        self.match(self.werkzeug_map, path, method),
+                        self.match(self.route_map, path, method),
+                    )
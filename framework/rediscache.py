@@ -71,6 +71,21 @@ def set(key, value, time=86400):
         redis_client.set(cache_key, pickle.dumps(value))
 
 
+def add(key, value, time=86400) -> bool:
+    """Redis SET NX sets the key only if it does not already exist,
+    https://redis.io/commands/set/.  Return True if the value was stored.
+
+    ``time`` sets the expire time for this key, in seconds.
+    """  # noqa: D205
+    if redis_client is None:
+        return True
+
+    cache_key = add_gae_prefix(key)
+    return bool(
+        redis_client.set(cache_key, pickle.dumps(value), ex=time, nx=True)
+    )
+
+
 def get(key):
     """Redis GET gets the value of key. Return None if ``key`` does not
     exist; return an error if the value returned is not a str/binary.
@@ -47,6 +47,16 @@ class RedisCacheFunctionTests(testing_config.CustomTestCase):
         rediscache.set(KEY_4, '123', 3600)
         self.assertEqual('123', rediscache.get(KEY_4))
 
+    def test_add(self):
+        """We only cache a value if the key is not already set."""
+        rediscache.delete(KEY_7)
+        self.assertTrue(rediscache.add(KEY_7, '701', 3600))
+        self.assertEqual('701', rediscache.get(KEY_7))
+
+        self.assertFalse(rediscache.add(KEY_7, '702', 3600))
+        self.assertEqual('701', rediscache.get(KEY_7))
+        rediscache.delete(KEY_7)
+
     def test_set_and_get_multi(self):
         """We can cache values and retrieve them from the cache."""
         self.assertEqual({}, rediscache.get_multi([]))
@@ -19,15 +19,25 @@ Defines the various types of approval gates (e.g., Intent to Ship, Privacy Revie
 their rules, required approvers, and Service Level Objectives (SLOs).
 """
 
-import base64
 import collections
 import datetime
-import json
+import functools
 import logging
+import sys
+import time
 from dataclasses import dataclass
 from typing import Optional
 
 import requests
+from google.cloud import ndb  # type: ignore
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # pybase64 uses SIMD kernels; fall back to the stdlib if unavailable.
+    import pybase64 as base64
+except ImportError:  # pragma: no cover
+    import base64  # type: ignore[no-redef]
 
 import settings
 from framework import permissions, rediscache
@@ -36,11 +46,50 @@ from internals.review_models import Gate, GateDef, OwnersFile, Vote
 
 APPROVERS_CACHE_KEY = 'approvers'
 CACHE_EXPIRATION = 60 * 60  # One hour
+STALE_CACHE_EXPIRATION = 24 * 60 * 60  # One day
+LOCAL_CACHE_EXPIRATION = 60  # One minute
+DECODED_OWNERS_CACHE_MAX_SIZE = 8
 IN_NDB = 'stored in ndb'
+# Connect and read timeouts, in seconds, for OWNERS and rotation requests.
+HTTP_TIMEOUT = (3, 10)
+# Retries of those requests after a 429 or 5xx response.  Connect errors and
+# timeouts are not retried, so a hung server costs one timeout.
+HTTP_STATUS_RETRIES = 2
+# A cache refill makes up to 1 + HTTP_STATUS_RETRIES requests, each of which
+# can take sum(HTTP_TIMEOUT) seconds.  The refill lock must outlive all of
+# them, plus backoff, or a second request would start another slow fetch.
+REFILL_LOCK_EXPIRATION = (1 + HTTP_STATUS_RETRIES) * sum(HTTP_TIMEOUT) + 5
+
+# Reuse connections to googlesource and the rotation servers across requests.
+_HTTP = requests.Session()
+_HTTP.mount(
+    'https://',
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=HTTP_STATUS_RETRIES,
+            connect=0,
+            read=0,
+            backoff_factor=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        ),
+    ),
+)
+
+
+def _http_get(url, **kwargs) -> requests.Response | None:
+    """GET url with a timeout, or return None if the request failed."""
+    try:
+        return _HTTP.get(url, timeout=HTTP_TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        logging.error('Could not fetch %r: %r', url, e)
+        return None
 
 
-ONE_LGTM = 'One LGTM'
-THREE_LGTM = 'Three LGTMs'
+ONE_LGTM = sys.intern('One LGTM')
+THREE_LGTM = sys.intern('Three LGTMs')
 API_OWNERS_URL = (
     'https://chromium.googlesource.com/chromium/src/+/'
     'main/third_party/blink/API_OWNERS?format=TEXT'
@@ -297,6 +346,27 @@ APPROVAL_FIELDS_BY_ID = {
 }
 
 
+# Gate types grouped by (team_name, rule).  Gates in the same group are
+# reviewed by the same people, so an assignment on one can be reused.
+_GATE_TYPES_BY_TEAM_RULE: dict[tuple[str, str], frozenset[int]] = {
+    (afd.team_name, afd.rule): frozenset(
+        other.gate_type
+        for other in APPROVAL_FIELDS_BY_ID.values()
+        if other.team_name == afd.team_name and other.rule == afd.rule
+    )
+    for afd in APPROVAL_FIELDS_BY_ID.values()
+}
+
+_ALL_GATE_TYPES: frozenset[int] = frozenset(APPROVAL_FIELDS_BY_ID)
+
+# Gate types whose approvers and reviewer rotation are configured in GateDef.
+_IN_NDB_GATE_TYPES: frozenset[int] = frozenset(
+    gate_type
+    for gate_type, afd in APPROVAL_FIELDS_BY_ID.items()
+    if afd.approvers == IN_NDB
+)
+
+
 def fetch_owners(url) -> list[str]:
     """Load a list of email addresses from an OWNERS file."""
     if settings.UNIT_TEST_MODE or settings.PLAYWRIGHT_MODE:
@@ -307,9 +377,17 @@ def fetch_owners(url) -> list[str]:
         logging.info('Using fresh owners_file')
         return decode_raw_owner_content(owners_file.raw_content)
 
-    response = requests.get(url)
-    if response.status_code == 200:
+    headers = {}
+    if owners_file and owners_file.etag:
+        headers['If-None-Match'] = owners_file.etag
+    response = _http_get(url, headers=headers)
+    if response is not None and response.status_code == 200:
         content = response.content
+        etag = response.headers.get('ETag')
+    elif response is not None and response.status_code == 304 and owners_file:
+        logging.info('OWNERS file not modified')
+        content = owners_file.raw_content
+        etag = owners_file.etag
     else:
         logging.error('Could not fetch %r', url)
         logging.error(
@@ -318,26 +396,49 @@ def fetch_owners(url) -> list[str]:
         if owners_file:
             logging.info('Marking stale owners_file as fresh')
             content = owners_file.raw_content
+            etag = owners_file.etag
         else:
             logging.info('No stored owners_file available.  Using [].')
             return []
 
-    OwnersFile(url=url, raw_content=content).add_owner_file()
+    # Don't wait for the write here, so that it overlaps the rest of this
+    # request.  The NDB context still waits for it before the response is sent.
+    write_future = OwnersFile(
+        url=url, raw_content=content, etag=etag
+    ).add_owner_file_async()
+    write_future.add_done_callback(_log_owner_file_write_error)
     return decode_raw_owner_content(content)
 
 
+def _log_owner_file_write_error(write_future) -> None:
+    """Log a failed OWNERS file write, since no caller checks its result."""
+    exception = write_future.exception()
+    if exception is not None:
+        logging.error('Could not store OWNERS file: %r', exception)
+
+
 def decode_raw_owner_content(raw_content) -> list[str]:
     """Decode base64 encoded OWNERS file content and return a list of email addresses."""
+    return list(_decode_raw_owner_content(raw_content))
+
+
+# The same OWNERS revision is decoded again on every cache refill, so keep
+# the results for a few recent revisions.
+@functools.lru_cache(maxsize=DECODED_OWNERS_CACHE_MAX_SIZE)
+def _decode_raw_owner_content(raw_content: str | bytes) -> tuple[str, ...]:
+    """Parse OWNERS content.  Callers get a copy since this is memoized."""
     owners = []
-    decoded = base64.b64decode(raw_content).decode()
-    for line in decoded.split('\n'):
-        if '#' in line:
-            line = line[: line.index('#')]
+    # Scan the decoded bytes directly and only decode lines that we keep.
+    decoded = base64.b64decode(raw_content, validate=False)
+    for line in decoded.splitlines():
+        comment_start = line.find(b'#')
+        if comment_start >= 0:
+            line = line[:comment_start]
         line = line.strip()
-        if '@' in line and '.' in line:
-            owners.append(line)
+        if b'@' in line and b'.' in line:
+            owners.append(line.decode())
 
-    return owners
+    return tuple(owners)
 
 
 def auto_assign_reviewer(gate):
@@ -345,33 +446,38 @@ def auto_assign_reviewer(gate):
     If this gate has a reviewer rotation, use the current on-call user.
     """  # noqa: D205
     afd = APPROVAL_FIELDS_BY_ID[gate.gate_type]
+    same_team_gate_types = _GATE_TYPES_BY_TEAM_RULE[(afd.team_name, afd.rule)]
+
+    # Start both Datastore reads now so that they overlap.
+    gates_future = Gate.query(Gate.feature_id == gate.feature_id).fetch_async()
+    gate_def_future = None
+    if gate.gate_type in _IN_NDB_GATE_TYPES and not (
+        settings.UNIT_TEST_MODE or settings.PLAYWRIGHT_MODE
+    ):
+        gate_def_future = GateDef.get_gate_def_async(gate.gate_type)
 
-    all_gates: list[Gate] = Gate.query(
-        Gate.feature_id == gate.feature_id
-    ).fetch()
+    gate_id = gate.key.integer_id()
+    all_gates: list[Gate] = gates_future.get_result()
     for other_gate in all_gates:
-        other_afd = APPROVAL_FIELDS_BY_ID[other_gate.gate_type]
         if (
-            other_gate.key.integer_id() != gate.key.integer_id()
-            and other_afd.team_name == afd.team_name
-            and other_afd.rule == afd.rule
+            other_gate.gate_type in same_team_gate_types
+            and other_gate.key.integer_id() != gate_id
             and other_gate.assignee_emails
         ):
             gate.assignee_emails = other_gate.assignee_emails
             gate.put()
             return
 
-    if afd.approvers != IN_NDB:
+    if gate_def_future is None:
         return
 
-    if settings.UNIT_TEST_MODE or settings.PLAYWRIGHT_MODE:
-        return
-
-    gate_def = GateDef.get_gate_def(gate.gate_type)
+    gate_def: GateDef = gate_def_future.get_result()
     if not gate_def.rotation_url:
         return
 
-    response = requests.get(gate_def.rotation_url)
+    response = _http_get(gate_def.rotation_url)
+    if response is None:
+        return
     if response.status_code != 200:
         logging.error('Could not fetch %r', gate_def.rotation_url)
         logging.error(
@@ -380,58 +486,119 @@ def auto_assign_reviewer(gate):
         return
 
     try:
+        response_json = response.json()
+    except ValueError:
         logging.info(
-            'response.content is:\n%s',
+            'failed to parse rotation content:\n%s',
             response.content[: settings.MAX_LOG_LINE],
         )
-        response_json = json.loads(response.content)
-    except ValueError:
-        logging.info('failed to parse content')
+        return
 
     if 'emails' in response_json:
         gate.assignee_emails = response_json['emails']
         gate.put()
 
 
+# Process-local copies of approver lists that sit in front of Redis.
+# Each entry is (time loaded, value).  Staleness is bounded by the short TTL.
+# Values are tuples so that no caller can modify the shared copy.
+_local_approvers: dict[int, tuple[float, tuple[str, ...]]] = {}
+_local_approvable_by_email: tuple[float, dict[str, frozenset[int]]] | None = (
+    None
+)
+
+
+def clear_local_caches():
+    """Forget process-local approver lists, e.g., between unit tests."""
+    global _local_approvable_by_email
+    _local_approvers.clear()
+    _local_approvable_by_email = None
+
+
 def get_approvers(gate_type) -> list[str]:
     """Return a list of email addresses of users allowed to approve."""
     if gate_type not in APPROVAL_FIELDS_BY_ID:
         return []
 
+    local_entry = _local_approvers.get(gate_type)
+    if (
+        local_entry
+        and time.monotonic() - local_entry[0] < LOCAL_CACHE_EXPIRATION
+    ):
+        return list(local_entry[1])
+
+    owners = _get_approvers_from_redis(gate_type)
+    if owners:
+        _local_approvers[gate_type] = (time.monotonic(), tuple(owners))
+    return owners
+
+
+def _get_approvers_from_redis(gate_type) -> list[str]:
+    """Return approvers cached in Redis, refilling the cache if needed."""
     cache_key = '%s|%s' % (APPROVERS_CACHE_KEY, gate_type)
     cached_approvers = rediscache.get(cache_key)
     if cached_approvers:
         return cached_approvers
 
+    # Only one request refills an expired entry, others use the stale value.
+    lock_key: str | None = cache_key + '|lock'
+    stale_key = cache_key + '|stale'
+    if not rediscache.add(lock_key, True, time=REFILL_LOCK_EXPIRATION):
+        stale_approvers = rediscache.get(stale_key)
+        if stale_approvers is not None:
+            return stale_approvers
+        lock_key = None  # Nothing to serve yet, so load without the lock.
+
+    try:
+        owners = _load_approvers(gate_type)
+        rediscache.set(cache_key, owners, time=CACHE_EXPIRATION)
+        rediscache.set(stale_key, owners, time=STALE_CACHE_EXPIRATION)
+    finally:
+        if lock_key:
+            rediscache.delete(lock_key)
+    return owners
+
+
+def _load_approvers(gate_type) -> list[str]:
+    """Read the list of approvers from its source of truth."""
     afd = APPROVAL_FIELDS_BY_ID[gate_type]
 
     if afd.approvers == IN_NDB:
         gate_def = GateDef.get_gate_def(gate_type)
-        owners = gate_def.approvers
+        return gate_def.approvers
     elif isinstance(afd.approvers, str):
         # afd.approvers can be either a hard-coded list of approver emails
         # or it can be a URL of an OWNERS file.  Right now we only use the
         # URL approach, but both are supported.
-        owners = fetch_owners(afd.approvers)
+        return fetch_owners(afd.approvers)
     else:
-        owners = afd.approvers
+        return afd.approvers
 
-    rediscache.set(cache_key, owners, time=CACHE_EXPIRATION)
-    return owners
 
-
-def fields_approvable_by(user):
+def fields_approvable_by(user) -> frozenset[int]:
     """Return a set of field IDs that the user is allowed to approve."""
     if permissions.can_admin_site(user):
-        return set(APPROVAL_FIELDS_BY_ID.keys())
+        return _ALL_GATE_TYPES
+
+    global _local_approvable_by_email
+    if (
+        _local_approvable_by_email is None
+        or time.monotonic() - _local_approvable_by_email[0]
+        >= LOCAL_CACHE_EXPIRATION
+    ):
+        approvable_by_email: dict[str, set[int]] = collections.defaultdict(set)
+        for gate_type in APPROVAL_FIELDS_BY_ID:
+            for approver in get_approvers(gate_type):
+                approvable_by_email[approver].add(gate_type)
+        _local_approvable_by_email = (
+            time.monotonic(),
+            {
+                approver: frozenset(gate_types)
+                for approver, gate_types in approvable_by_email.items()
+            },
+        )
 
-    email = user.email()
-    approvable_ids = {
-        gate_type
-        for gate_type in APPROVAL_FIELDS_BY_ID
-        if email in get_approvers(gate_type)
-    }
-    return approvable_ids
+    return _local_approvable_by_email[1].get(user.email(), frozenset())
 
 
 def is_valid_gate_type(gate_type):
@@ -460,17 +627,22 @@ def set_vote(
             return None
         gate_id = gate.key.integer_id()
         gate_type = gate.gate_type
+        gate_future = None
     else:
-        gate = Gate.get_by_id(gate_id)
+        gate_future = Gate.get_by_id_async(gate_id)
 
     if not Vote.is_valid_state(new_state):
         raise ValueError('Invalid approval state')
 
-    new_vote = None
-    now = datetime.datetime.now()
-    existing_list: list[Vote] = Vote.get_votes(
+    # Look for this user's vote while the gate is still loading.
+    existing_future = Vote.get_votes_async(
         feature_id=feature_id, gate_id=gate_id, set_by=set_by_email
     )
+    if gate_future:
+        gate = gate_future.get_result()
+
+    now = datetime.datetime.now()
+    existing_list: list[Vote] = existing_future.get_result()
     if existing_list:
         existing = existing_list[0]
         existing.set_on = now
@@ -485,19 +657,14 @@ def set_vote(
             set_on=now,
             set_by=set_by_email,
         )
-        new_vote.put()
-
-    if gate:
-        votes = Vote.get_votes(gate_id=gate.key.integer_id())
-        # Check for double votes that could arise from a race condition.
-        double_votes = [
-            v for v in votes if v.set_by == set_by_email and v.set_on < now
-        ]
-        if new_vote and double_votes:
-            # This handler lost the race condition, back out and bail.
-            new_vote.key.delete()
+        if not _put_first_vote(new_vote):
+            # This handler lost a race with another vote by the same user.
             return None
 
+    if gate:
+        # Query after our write so that votes that other approvers saved
+        # concurrently are counted too.
+        votes = Vote.get_votes(gate_id=gate_id)
         old_gate_state = gate.state
         state_was_updated = update_gate_approval_state(gate, votes)
         slo_was_updated = slo.record_vote(gate, votes, old_gate_state)
@@ -507,28 +674,62 @@ def set_vote(
     return None
 
 
+@ndb.transactional(retries=2)
+def _put_first_vote(new_vote: Vote) -> bool:
+    """Store new_vote unless its author already has a vote on the gate."""
+    existing_key = Vote.query(
+        Vote.gate_id == new_vote.gate_id, Vote.set_by == new_vote.set_by
+    ).get(keys_only=True)
+    if existing_key:
+        return False
+    new_vote.put()
+    return True
+
+
 def get_gate_by_type(feature_id: int, gate_type: int):
     """Return a single gate based on the feature and gate type."""
     # TODO(danielrsmith): As of today, there is only 1 gate per
     # gate type and feature. Passing the gate ID will be required when adding
     # UI functionality for multiple versions of the same stage/gate.
-    gates: list[Gate] = Gate.query(
+    return Gate.query(
         Gate.feature_id == feature_id, Gate.gate_type == gate_type
-    ).fetch()
-    if len(gates) == 0:
-        return None
-    return gates[0]
+    ).get()
+
+
+# Bitmask of vote states that can determine the gate state when there are
+# not enough LGTMs.  Vote states are small non-negative ints.
+_INTERESTING_STATES_MASK = (
+    (1 << Vote.NEEDS_WORK)
+    | (1 << Vote.REVIEW_STARTED)
+    | (1 << Vote.REVIEW_REQUESTED)
+    | (1 << Vote.DENIED)
+    | (1 << Vote.INTERNAL_REVIEW)
+    | (1 << Vote.NA_REQUESTED)
+)
 
 
 def _calc_gate_state(votes: list[Vote], rule: str) -> int:
     """Returns the state that a gate should have based on its votes."""
-    # NO_RESPONSE votes never affect the vote calculation.
-    votes = [v for v in votes if v.state != Vote.NO_RESPONSE]
-    counts = collections.Counter(v.state for v in votes)
+    counts: collections.Counter[int] = collections.Counter()
+    num_votes = 0
+    latest_state: int | None = None
+    latest_set_on: datetime.datetime | None = None
+    for vote in votes:
+        state = vote.state
+        # NO_RESPONSE votes never affect the vote calculation.
+        if state == Vote.NO_RESPONSE:
+            continue
+        num_votes += 1
+        counts[state] += 1
+        if (_INTERESTING_STATES_MASK >> state) & 1 and (
+            latest_set_on is None or vote.set_on > latest_set_on
+        ):
+            latest_state = state
+            latest_set_on = vote.set_on
 
     if counts[Vote.NA_SELF] == 1 and rule == ONE_LGTM:
         # A self-certified NA makes the gate NA_SELF iff it is the only vote.
-        if len(votes) == 1:
+        if num_votes == 1:
             return Vote.NA_SELF
         # Any added NA_VERIFIED votes make the gate NA_VERIFIED.
         if counts[Vote.NA_VERIFIED] >= 1:
@@ -548,16 +749,8 @@ def _calc_gate_state(votes: list[Vote], rule: str) -> int:
     # REVIEW_STARTED, INTERNAL_REVIEW, or DENIED.  This allows a
     # feature owner to re-request a review after addressing feedback and
     # have the gate show up as REVIEW_STARTED again.
-    for vote in sorted(votes, reverse=True, key=lambda v: v.set_on):
-        if vote.state in (
-            Vote.NEEDS_WORK,
-            Vote.REVIEW_STARTED,
-            Vote.REVIEW_REQUESTED,
-            Vote.DENIED,
-            Vote.INTERNAL_REVIEW,
-            Vote.NA_REQUESTED,
-        ):
-            return vote.state
+    if latest_state is not None:
+        return latest_state
 
     # An API Owner can kick off review of an I2S thread that was not detected
     # by voting Approve for their "LGTM1".
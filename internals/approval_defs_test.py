@@ -22,12 +22,43 @@ import base64
 import datetime
 from unittest import mock
 
+import requests
+import urllib3
+from google.cloud import ndb  # type: ignore
+
 import testing_config  # Must be imported before the module under test.
-from framework import rediscache
+from framework import rediscache, users
 from internals import approval_defs, core_enums
 from internals.review_models import Gate, GateDef, OwnersFile, Vote
 
 
+class HttpRetryTest(testing_config.CustomTestCase):
+    """Tests for the retry policy of OWNERS and rotation requests."""
+
+    def setUp(self):
+        """Set up the test environment."""
+        adapter = approval_defs._HTTP.get_adapter('https://example.com')
+        self.retry = adapter.max_retries
+
+    def test__status(self):
+        """Throttled and failed responses are retried a few times."""
+        self.assertEqual(approval_defs.HTTP_STATUS_RETRIES, self.retry.total)
+        self.assertTrue(self.retry.is_retry('GET', 503))
+        self.assertFalse(self.retry.is_retry('GET', 404))
+
+    def test__timeout(self):
+        """A read timeout fails on the first attempt."""
+        error = urllib3.exceptions.ReadTimeoutError(None, '/', 'timed out')
+        with self.assertRaises(urllib3.exceptions.MaxRetryError):
+            self.retry.increment('GET', '/', error=error)
+
+    def test__connect_error(self):
+        """A connect error or timeout fails on the first attempt."""
+        error = urllib3.exceptions.ConnectTimeoutError('timed out')
+        with self.assertRaises(urllib3.exceptions.MaxRetryError):
+            self.retry.increment('GET', '/', error=error)
+
+
 class FetchOwnersTest(testing_config.CustomTestCase):
     """Tests for FetchOwnersTest."""
 
@@ -53,19 +84,25 @@ class FetchOwnersTest(testing_config.CustomTestCase):
         self.mock_unit_test_mode.stop()
         super().tearDown()
 
-    @mock.patch('requests.get')
+    @mock.patch('internals.approval_defs._HTTP.get')
     def test__normal(self, mock_get):
         """We can fetch and parse an OWNERS file.  And reuse cached value."""
         encoded = base64.b64encode(self.FILE_CONTENTS.encode())
         mock_get.return_value = testing_config.Blank(
-            status_code=200, content=encoded
+            status_code=200, content=encoded, headers={'ETag': 'abc'}
         )
 
         actual = approval_defs.fetch_owners('https://example.com')
+        # Let the background write of the OWNERS file finish.
+        ndb.get_context().eventloop.run()
         again = approval_defs.fetch_owners('https://example.com')
 
         # Only called once because second call will be an ndb hit.
-        mock_get.assert_called_once_with('https://example.com')
+        mock_get.assert_called_once_with(
+            'https://example.com',
+            headers={},
+            timeout=approval_defs.HTTP_TIMEOUT,
+        )
         self.assertEqual(
             actual,
             ['owner1@example.com', 'owner2@example.com', 'owner3@example.com'],
@@ -73,7 +110,7 @@ class FetchOwnersTest(testing_config.CustomTestCase):
         self.assertEqual(again, actual)
 
     @mock.patch('logging.error')
-    @mock.patch('requests.get')
+    @mock.patch('internals.approval_defs._HTTP.get')
     def test__error__use_ndb(self, mock_get, mock_err):
         """If NDB is old and we can't read the OWNERS file, use old value anyway."""
         encoded = base64.b64encode(self.FILE_CONTENTS.encode())
@@ -91,7 +128,25 @@ class FetchOwnersTest(testing_config.CustomTestCase):
         )
 
     @mock.patch('logging.error')
-    @mock.patch('requests.get')
+    @mock.patch('internals.approval_defs._HTTP.get')
+    def test__timeout__use_ndb(self, mock_get, mock_err):
+        """If the OWNERS file request times out, use the old value."""
+        encoded = base64.b64encode(self.FILE_CONTENTS.encode())
+        OwnersFile(
+            url='https://example.com',
+            raw_content=encoded,
+            created_on=datetime.datetime(2022, 1, 1),
+        ).put()
+        mock_get.side_effect = requests.Timeout()
+
+        actual = approval_defs.fetch_owners('https://example.com')
+        self.assertEqual(
+            actual,
+            ['owner1@example.com', 'owner2@example.com', 'owner3@example.com'],
+        )
+
+    @mock.patch('logging.error')
+    @mock.patch('internals.approval_defs._HTTP.get')
     def test__error__use_empty_list(self, mock_get, mock_err):
         """If NDB is missing and we can't read the OWNERS file, use []."""
         # Don't create any test existing OwnersFile in NDB.
@@ -100,6 +155,73 @@ class FetchOwnersTest(testing_config.CustomTestCase):
         actual = approval_defs.fetch_owners('https://example.com')
         self.assertEqual(actual, [])
 
+    @mock.patch('internals.approval_defs._HTTP.get')
+    def test__not_modified__use_ndb(self, mock_get):
+        """If the OWNERS file has not changed, reuse the stored content."""
+        encoded = base64.b64encode(self.FILE_CONTENTS.encode())
+        OwnersFile(
+            url='https://example.com',
+            raw_content=encoded,
+            etag='abc',
+            created_on=datetime.datetime(2022, 1, 1),
+        ).put()
+        mock_get.return_value = testing_config.Blank(status_code=304)
+
+        actual = approval_defs.fetch_owners('https://example.com')
+        ndb.get_context().eventloop.run()
+        mock_get.assert_called_once_with(
+            'https://example.com',
+            headers={'If-None-Match': 'abc'},
+            timeout=approval_defs.HTTP_TIMEOUT,
+        )
+        self.assertEqual(
+            actual,
+            ['owner1@example.com', 'owner2@example.com', 'owner3@example.com'],
+        )
+        self.assertEqual(
+            'abc',
+            OwnersFile.get_raw_owner_file('https://example.com').etag,
+        )
+
+    @mock.patch('logging.error')
+    @mock.patch('internals.review_models.OwnersFile.add_owner_file_async')
+    @mock.patch('internals.approval_defs._HTTP.get')
+    def test__write_fails(self, mock_get, mock_add, mock_err):
+        """If storing the OWNERS file fails, log it and use the content."""
+        encoded = base64.b64encode(self.FILE_CONTENTS.encode())
+        mock_get.return_value = testing_config.Blank(
+            status_code=200, content=encoded, headers={'ETag': 'abc'}
+        )
+        write_future = ndb.Future()
+        mock_add.return_value = write_future
+
+        actual = approval_defs.fetch_owners('https://example.com')
+        mock_err.assert_not_called()
+        write_future.set_exception(ValueError('write failed'))
+
+        self.assertEqual(
+            actual,
+            ['owner1@example.com', 'owner2@example.com', 'owner3@example.com'],
+        )
+        mock_err.assert_called_once_with(
+            'Could not store OWNERS file: %r', write_future.exception()
+        )
+
+
+class DecodeRawOwnerContentTest(testing_config.CustomTestCase):
+    """Tests for decoding OWNERS file content."""
+
+    def test__memoized(self):
+        """Each call returns a new list even when the decoding is cached."""
+        encoded = base64.b64encode(FetchOwnersTest.FILE_CONTENTS.encode())
+        first = approval_defs.decode_raw_owner_content(encoded)
+        first.append('extra@example.com')
+        second = approval_defs.decode_raw_owner_content(encoded)
+        self.assertEqual(
+            ['owner1@example.com', 'owner2@example.com', 'owner3@example.com'],
+            second,
+        )
+
 
 class AutoAssignmentTest(testing_config.CustomTestCase):
     """Tests for AutoAssignment."""
@@ -128,6 +250,11 @@ class AutoAssignmentTest(testing_config.CustomTestCase):
             gate_type=core_enums.GATE_SECURITY_SHIP,
         )
 
+    def tearDown(self):
+        """Clean up the test environment."""
+        for gate_def in GateDef.query():
+            gate_def.key.delete()
+
     def test__with_prior_assignment__match(self):
         """If there was a prior assignement, use it."""
         self.gate_2.put()
@@ -158,6 +285,35 @@ class AutoAssignmentTest(testing_config.CustomTestCase):
         self.gate_3.put()  # Gate for a different team
         self.assertEqual([], self.gate_1.assignee_emails)
 
+    @mock.patch('settings.UNIT_TEST_MODE', False)
+    @mock.patch('internals.approval_defs._HTTP.get')
+    def test__rotation(self, mock_get):
+        """If there is no prior assignment, use the on-call reviewer."""
+        GateDef(
+            gate_type=core_enums.GATE_PRIVACY_ORIGIN_TRIAL,
+            rotation_url='https://rotation.example.com',
+        ).put()
+        mock_get.return_value = mock.Mock(status_code=200)
+        mock_get.return_value.json.return_value = {
+            'emails': ['oncall@example.com']
+        }
+        approval_defs.auto_assign_reviewer(self.gate_1)
+        self.assertEqual(['oncall@example.com'], self.gate_1.assignee_emails)
+
+    @mock.patch('logging.info')
+    @mock.patch('settings.UNIT_TEST_MODE', False)
+    @mock.patch('internals.approval_defs._HTTP.get')
+    def test__rotation__bad_json(self, mock_get, mock_info):
+        """If the rotation response cannot be parsed, bail."""
+        GateDef(
+            gate_type=core_enums.GATE_PRIVACY_ORIGIN_TRIAL,
+            rotation_url='https://rotation.example.com',
+        ).put()
+        mock_get.return_value = mock.Mock(status_code=200, content=b'oops')
+        mock_get.return_value.json.side_effect = ValueError
+        approval_defs.auto_assign_reviewer(self.gate_1)
+        self.assertEqual([], self.gate_1.assignee_emails)
+
 
 MOCK_APPROVALS_BY_ID = {
     1: approval_defs.GateInfo(
@@ -205,6 +361,8 @@ class GetApproversTest(testing_config.CustomTestCase):
         for gate_type in approval_defs.APPROVAL_FIELDS_BY_ID:
             cache_key = '%s|%s' % (approval_defs.APPROVERS_CACHE_KEY, gate_type)
             rediscache.delete(cache_key)
+            rediscache.delete(cache_key + '|lock')
+            rediscache.delete(cache_key + '|stale')
 
     @mock.patch(
         'internals.approval_defs.APPROVAL_FIELDS_BY_ID', MOCK_APPROVALS_BY_ID
@@ -257,6 +415,144 @@ class GetApproversTest(testing_config.CustomTestCase):
         self.assertEqual(3, existing_gate_defs[0].gate_type)
         self.assertEqual(['a', 'b'], existing_gate_defs[0].approvers)
 
+    @mock.patch(
+        'internals.approval_defs.APPROVAL_FIELDS_BY_ID', MOCK_APPROVALS_BY_ID
+    )
+    @mock.patch('internals.approval_defs.fetch_owners')
+    def test__local_cache(self, mock_fetch_owner):
+        """Recently loaded approvers are served without going to Redis."""
+        mock_fetch_owner.return_value = ['owner@example.com']
+        approval_defs.get_approvers(2)
+        self.clearCache()
+        actual = approval_defs.get_approvers(2)
+        mock_fetch_owner.assert_called_once_with('https://example.com')
+        self.assertEqual(actual, ['owner@example.com'])
+
+        # Callers get their own list, so changing it does not alter the cache.
+        actual.append('other@example.com')
+        self.assertEqual(['owner@example.com'], approval_defs.get_approvers(2))
+
+        approval_defs.clear_local_caches()
+        approval_defs.get_approvers(2)
+        self.assertEqual(2, mock_fetch_owner.call_count)
+
+    @mock.patch(
+        'internals.approval_defs.APPROVAL_FIELDS_BY_ID', MOCK_APPROVALS_BY_ID
+    )
+    @mock.patch('internals.approval_defs.fetch_owners')
+    def test__refill_in_progress__use_stale(self, mock_fetch_owner):
+        """While another request refills the cache, serve the stale value."""
+        rediscache.set('approvers|2|lock', True)
+        rediscache.set('approvers|2|stale', ['stale@example.com'])
+        actual = approval_defs.get_approvers(2)
+        mock_fetch_owner.assert_not_called()
+        self.assertEqual(actual, ['stale@example.com'])
+
+    @mock.patch(
+        'internals.approval_defs.APPROVAL_FIELDS_BY_ID', MOCK_APPROVALS_BY_ID
+    )
+    @mock.patch('internals.approval_defs.fetch_owners')
+    def test__refill__updates_stale(self, mock_fetch_owner):
+        """A refill stores a long-lived stale copy and releases the lock."""
+        mock_fetch_owner.return_value = ['owner@example.com']
+        actual = approval_defs.get_approvers(2)
+        self.assertEqual(actual, ['owner@example.com'])
+        self.assertEqual(
+            ['owner@example.com'], rediscache.get('approvers|2|stale')
+        )
+        self.assertIsNone(rediscache.get('approvers|2|lock'))
+
+
+@mock.patch(
+    'internals.approval_defs.APPROVAL_FIELDS_BY_ID', MOCK_APPROVALS_BY_ID
+)
+@mock.patch('framework.permissions.can_admin_site', return_value=False)
+@mock.patch('internals.approval_defs.get_approvers')
+class FieldsApprovableByTest(testing_config.CustomTestCase):
+    """Tests for finding the gate types that a user can approve."""
+
+    APPROVERS = {
+        1: ['one@example.com'],
+        2: ['one@example.com', 'two@example.com'],
+        3: ['two@example.com'],
+    }
+
+    def setUp(self):
+        """Set up the test environment."""
+        approval_defs.clear_local_caches()
+        self.user_1 = users.User(email='one@example.com')
+        self.user_2 = users.User(email='two@example.com')
+
+    def tearDown(self):
+        """Clean up the test environment."""
+        approval_defs.clear_local_caches()
+
+    def test__approver(self, mock_get_approvers, mock_admin):
+        """An approver can approve exactly the gate types they are listed on."""
+        mock_get_approvers.side_effect = self.APPROVERS.get
+        self.assertEqual(
+            frozenset({1, 2}), approval_defs.fields_approvable_by(self.user_1)
+        )
+        self.assertEqual(
+            frozenset({2, 3}), approval_defs.fields_approvable_by(self.user_2)
+        )
+        # The reverse index was built once and reused for the second user.
+        self.assertEqual(3, mock_get_approvers.call_count)
+
+    def test__not_approver(self, mock_get_approvers, mock_admin):
+        """A user who is not listed on any gate can approve nothing."""
+        mock_get_approvers.side_effect = self.APPROVERS.get
+        user = users.User(email='other@example.com')
+        self.assertEqual(frozenset(), approval_defs.fields_approvable_by(user))
+
+    def test__admin(self, mock_get_approvers, mock_admin):
+        """A site admin can approve every gate type."""
+        mock_admin.return_value = True
+        user = users.User(email='admin@example.com')
+        self.assertIs(
+            approval_defs._ALL_GATE_TYPES,
+            approval_defs.fields_approvable_by(user),
+        )
+        mock_get_approvers.assert_not_called()
+
+    @mock.patch('time.monotonic')
+    def test__expired(self, mock_monotonic, mock_get_approvers, mock_admin):
+        """The index is rebuilt once LOCAL_CACHE_EXPIRATION has passed."""
+        mock_get_approvers.side_effect = self.APPROVERS.get
+        mock_monotonic.return_value = 1000.0
+        approval_defs.fields_approvable_by(self.user_1)
+
+        mock_get_approvers.side_effect = lambda gate_type: ['one@example.com']
+        mock_monotonic.return_value = (
+            1000.0 + approval_defs.LOCAL_CACHE_EXPIRATION - 1
+        )
+        self.assertEqual(
+            frozenset({1, 2}), approval_defs.fields_approvable_by(self.user_1)
+        )
+
+        mock_monotonic.return_value = (
+            1000.0 + approval_defs.LOCAL_CACHE_EXPIRATION
+        )
+        self.assertEqual(
+            frozenset({1, 2, 3}),
+            approval_defs.fields_approvable_by(self.user_1),
+        )
+
+    def test__cleared(self, mock_get_approvers, mock_admin):
+        """The index is rebuilt after clear_local_caches()."""
+        mock_get_approvers.side_effect = self.APPROVERS.get
+        approval_defs.fields_approvable_by(self.user_1)
+
+        mock_get_approvers.side_effect = lambda gate_type: ['one@example.com']
+        self.assertEqual(
+            frozenset({1, 2}), approval_defs.fields_approvable_by(self.user_1)
+        )
+        approval_defs.clear_local_caches()
+        self.assertEqual(
+            frozenset({1, 2, 3}),
+            approval_defs.fields_approvable_by(self.user_1),
+        )
+
 
 class IsValidGateTypeTest(testing_config.CustomTestCase):
     """Tests for gate type validation."""
@@ -420,6 +716,19 @@ class CalcGateStateTest(testing_config.CustomTestCase):
         )
         self.assertEqual(('approved', 'approved'), self.do_calc(AP, AP, RS, AP))
 
+    def test_votes_not_in_date_order(self):
+        """The most recent vote wins regardless of its position in the list."""
+        votes = [
+            Vote(state=NW, set_on=datetime.datetime(2022, 1, 3)),
+            Vote(state=RR, set_on=datetime.datetime(2022, 1, 1)),
+            Vote(state=NR, set_on=datetime.datetime(2022, 1, 4)),
+            Vote(state=RS, set_on=datetime.datetime(2022, 1, 2)),
+        ]
+        self.assertEqual(
+            Vote.NEEDS_WORK,
+            approval_defs._calc_gate_state(votes, approval_defs.ONE_LGTM),
+        )
+
     def test_self_cert_stands(self):
         """A feature owner self-certified and no one disagrees."""
         self.assertEqual(
@@ -668,3 +977,135 @@ class UpdateTest(testing_config.CustomTestCase):
             approval_defs.update_gate_approval_state(self.gate_1, votes)
         )
         self.assertEqual(self.gate_1.state, Vote.APPROVED)
+
+
+class SetVoteTest(testing_config.CustomTestCase):
+    """Tests for setting a vote on a gate."""
+
+    def setUp(self):
+        """Set up the test environment."""
+        self.gate = Gate(
+            id=2001,
+            feature_id=1,
+            stage_id=1,
+            gate_type=core_enums.GATE_API_SHIP,
+            state=Gate.PREPARING,
+        )
+        self.gate.put()
+
+    def tearDown(self):
+        """Clean up the test environment."""
+        for vote in Vote.query():
+            vote.key.delete()
+        self.gate.key.delete()
+
+    def test__new_vote(self):
+        """A user's first vote is stored and updates the gate state."""
+        actual = approval_defs.set_vote(
+            1, None, Vote.REVIEW_REQUESTED, 'user1@example.com', gate_id=2001
+        )
+
+        self.assertEqual(Vote.REVIEW_REQUESTED, actual)
+        votes = Vote.get_votes(gate_id=2001)
+        self.assertEqual(1, len(votes))
+        self.assertEqual('user1@example.com', votes[0].set_by)
+        self.assertEqual(core_enums.GATE_API_SHIP, votes[0].gate_type)
+        self.assertEqual(Vote.REVIEW_REQUESTED, Gate.get_by_id(2001).state)
+
+    def test__update_vote(self):
+        """A user's later vote replaces their earlier one."""
+        approval_defs.set_vote(
+            1, core_enums.GATE_API_SHIP, Vote.NEEDS_WORK, 'user1@example.com'
+        )
+        actual = approval_defs.set_vote(
+            1,
+            core_enums.GATE_API_SHIP,
+            Vote.REVIEW_STARTED,
+            'user1@example.com',
+        )
+
+        self.assertEqual(Vote.REVIEW_STARTED, actual)
+        votes = Vote.get_votes(gate_id=2001)
+        self.assertEqual(1, len(votes))
+        self.assertEqual(Vote.REVIEW_STARTED, votes[0].state)
+
+    def test__counts_votes_by_others(self):
+        """The gate state counts votes that other approvers already saved."""
+        for email in ['user1@example.com', 'user2@example.com']:
+            Vote(
+                feature_id=1,
+                gate_id=2001,
+                gate_type=core_enums.GATE_API_SHIP,
+                state=Vote.APPROVED,
+                set_on=datetime.datetime(2020, 1, 1),
+                set_by=email,
+            ).put()
+
+        actual = approval_defs.set_vote(
+            1, None, Vote.APPROVED, 'user3@example.com', gate_id=2001
+        )
+
+        self.assertEqual(Vote.APPROVED, actual)
+        self.assertEqual(Vote.APPROVED, Gate.get_by_id(2001).state)
+
+    def test__lost_race(self):
+        """If the same user's vote was stored meanwhile, nothing is written."""
+        Vote(
+            feature_id=1,
+            gate_id=2001,
+            gate_type=core_enums.GATE_API_SHIP,
+            state=Vote.NEEDS_WORK,
+            set_on=datetime.datetime(2020, 1, 1),
+            set_by='user1@example.com',
+        ).put()
+        # The lookup for an existing vote ran before that vote was stored.
+        no_votes_future = ndb.Future()
+        no_votes_future.set_result([])
+
+        with mock.patch.object(
+            Vote, 'get_votes_async', return_value=no_votes_future
+        ):
+            actual = approval_defs.set_vote(
+                1, None, Vote.APPROVED, 'user1@example.com', gate_id=2001
+            )
+
+        self.assertIsNone(actual)
+        votes = Vote.get_votes(gate_id=2001)
+        self.assertEqual(1, len(votes))
+        self.assertEqual(Vote.NEEDS_WORK, votes[0].state)
+        self.assertEqual(Gate.PREPARING, Gate.get_by_id(2001).state)
+
+    def test_put_first_vote(self):
+        """Only a user's first vote on a gate is stored."""
+        first_vote = Vote(
+            feature_id=1,
+            gate_id=2001,
+            gate_type=core_enums.GATE_API_SHIP,
+            state=Vote.NEEDS_WORK,
+            set_on=datetime.datetime(2020, 1, 1),
+            set_by='user1@example.com',
+        )
+        second_vote = Vote(
+            feature_id=1,
+            gate_id=2001,
+            gate_type=core_enums.GATE_API_SHIP,
+            state=Vote.APPROVED,
+            set_on=datetime.datetime(2020, 1, 2),
+            set_by='user1@example.com',
+        )
+
+        # The query by gate_id inside the transaction has no ancestor.
+        self.assertTrue(approval_defs._put_first_vote(first_vote))
+        self.assertFalse(approval_defs._put_first_vote(second_vote))
+
+        self.assertIsNone(second_vote.key)
+        votes = Vote.get_votes(gate_id=2001)
+        self.assertEqual([first_vote.key], [v.key for v in votes])
+
+    def test__invalid_state(self):
+        """An unknown vote state is rejected."""
+        with self.assertRaises(ValueError):
+            approval_defs.set_vote(
+                1, None, 999, 'user1@example.com', gate_id=2001
+            )
+        self.assertEqual([], Vote.get_votes(gate_id=2001))
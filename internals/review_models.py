@@ -31,15 +31,23 @@ class OwnersFile(ndb.Model):
 
     url = ndb.StringProperty(required=True)
     raw_content = ndb.TextProperty(required=True)
+    etag = ndb.StringProperty()
     created_on = ndb.DateTimeProperty(auto_now_add=True)
 
     def add_owner_file(self):
         """Add the owner file's content in ndb and delete all other entities."""
+        return self.add_owner_file_async().result()
+
+    @ndb.tasklet
+    def add_owner_file_async(self):
+        """Start replacing stored content for this URL and return a future."""
         # Delete all other entities.
-        ndb.delete_multi(
-            OwnersFile.query(OwnersFile.url == self.url).fetch(keys_only=True)
-        )
-        return self.put()
+        old_keys = yield OwnersFile.query(
+            OwnersFile.url == self.url
+        ).fetch_async(keys_only=True)
+        yield ndb.delete_multi_async(old_keys)
+        key = yield self.put_async()
+        return key
 
     @classmethod
     def get_raw_owner_file(cls, url) -> OwnersFile | None:
@@ -78,14 +86,20 @@ class GateDef(ndb.Model):
     @classmethod
     def get_gate_def(cls, gate_type: int) -> GateDef:
         """Load an existing GateDef and or create a new one."""
+        return cls.get_gate_def_async(gate_type).result()
+
+    @classmethod
+    @ndb.tasklet
+    def get_gate_def_async(cls, gate_type: int):
+        """Start loading or creating a GateDef and return a future."""
         query: ndb.Query = GateDef.query(GateDef.gate_type == gate_type)
-        gate_defs = query.fetch(1)
+        gate_defs = yield query.fetch_async(1)
         if gate_defs:
             gate_def = gate_defs[0]
         else:
             logging.info(f'Creating empty GateDef for {gate_type}')
             gate_def = GateDef(gate_type=gate_type)
-            gate_def.put()
+            yield gate_def.put_async()
 
         return gate_def
 
@@ -139,7 +153,7 @@ class Vote(ndb.Model):
     set_by = ndb.StringProperty(required=True)
 
     @classmethod
-    def get_votes(
+    def get_votes_async(
         cls,
         feature_id: Optional[int] = None,
         gate_id: Optional[int] = None,
@@ -147,8 +161,8 @@ class Vote(ndb.Model):
         states: Optional[list[int]] = None,
         set_by: Optional[str] = None,
         limit=None,
-    ) -> list[Vote]:
-        """Return the requested approvals."""
+    ) -> ndb.Future:
+        """Start fetching the requested approvals and return a future."""
         query: ndb.Query = Vote.query().order(Vote.set_on)
         if feature_id is not None:
             query = query.filter(Vote.feature_id == feature_id)
@@ -164,7 +178,27 @@ class Vote(ndb.Model):
         # Query with STRONG consistency because ndb defaults to
         # EVENTUAL consistency and we run this query immediately after
         # saving the user's change that we want included in the query.
-        votes: list[Vote] = query.fetch(limit, read_consistency=ndb.STRONG)
+        return query.fetch_async(limit, read_consistency=ndb.STRONG)
+
+    @classmethod
+    def get_votes(
+        cls,
+        feature_id: Optional[int] = None,
+        gate_id: Optional[int] = None,
+        gate_type: Optional[int] = None,
+        states: Optional[list[int]] = None,
+        set_by: Optional[str] = None,
+        limit=None,
+    ) -> list[Vote]:
+        """Return the requested approvals."""
+        votes: list[Vote] = cls.get_votes_async(
+            feature_id=feature_id,
+            gate_id=gate_id,
+            gate_type=gate_type,
+            states=states,
+            set_by=set_by,
+            limit=limit,
+        ).get_result()
         logging.info('found %r Votes', len(votes))
         return votes
 
@@ -18,7 +18,7 @@ import datetime
 
 import testing_config  # Must be imported before the module under test.
 from internals.core_models import FeatureEntry
-from internals.review_models import Activity, OwnersFile
+from internals.review_models import Activity, GateDef, OwnersFile
 
 
 class ActivityTest(testing_config.CustomTestCase):
@@ -119,6 +119,30 @@ class GateTest(testing_config.CustomTestCase):
     pass
 
 
+class GateDefTest(testing_config.CustomTestCase):
+    """Tests for GateDef."""
+
+    def tearDown(self):
+        """Clean up the test environment."""
+        for gate_def in GateDef.query():
+            gate_def.key.delete()
+
+    def test_get_gate_def_async__existing(self):
+        """An existing GateDef is loaded."""
+        GateDef(gate_type=1, approvers=['a@example.com']).put()
+        gate_def = GateDef.get_gate_def_async(1).result()
+        self.assertEqual(['a@example.com'], gate_def.approvers)
+        self.assertEqual(1, len(GateDef.query().fetch()))
+
+    def test_get_gate_def_async__new(self):
+        """An empty GateDef is stored if there was none."""
+        gate_def = GateDef.get_gate_def_async(2).result()
+        self.assertEqual(2, gate_def.gate_type)
+        self.assertEqual([], gate_def.approvers)
+        self.assertEqual(gate_def, GateDef.get_gate_def(2))
+        self.assertEqual(1, len(GateDef.query().fetch()))
+
+
 class OwnersFileTest(testing_config.CustomTestCase):
     """Tests for OwnersFile."""
 
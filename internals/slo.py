@@ -16,6 +16,7 @@
 
 import datetime
 import logging
+from operator import attrgetter
 
 import pytz
 
@@ -26,6 +27,7 @@ from internals.review_models import Gate, Vote
 
 PACIFIC_TZ = pytz.timezone('US/Pacific')
 MAX_DAYS = 30
+_SET_ON = attrgetter('set_on')
 
 
 def is_weekday(d: datetime.datetime) -> bool:
@@ -74,7 +76,8 @@ def record_vote(gate: Gate, votes: list[Vote], old_gate_state: int) -> bool:
     """Record a Gate SLO response time if needed.  Return True if changed."""
     if not votes:
         return False
-    latest_vote = sorted(votes, key=lambda v: v.set_on)[-1]
+    # Scan in reverse so that ties go to the last vote, as a stable sort would.
+    latest_vote = max(reversed(votes), key=_SET_ON)
     latest_state = latest_vote.state
 
     if latest_state == Vote.NO_RESPONSE:
@@ -55,42 +55,35 @@ from api import (
     webdx_feature_api,
     wpt_coverage_api,
 )
-from framework import basehandlers, csp, gemini_helpers, secrets, sendemail
+from framework import basehandlers, csp, secrets, sendemail
 from framework.basehandlers import Route
-from internals import (
-    data_backup,
-    detect_intent,
-    feature_links,
-    fetchmetrics,
-    inactive_users,
-    maintenance_scripts,
-    notifier,
-    reminders,
-    search_fulltext,
-)
+from internals import feature_links, notifier, search_fulltext
 from pages import featuredetail, guide, ot_requests, sitemap, users
 
-# Patch treading library to work-around bug with Google Cloud Logging.
-original_delete = threading.Thread._delete  # type: ignore
-
-
-def safe_delete(self):
-    """Safely delete the thread without raising a KeyError."""
-    try:
-        original_delete(self)
-    except KeyError:
-        pass
+# Concurrent first requests on a threaded worker must not each add handlers.
+_cloud_logging_lock = threading.Lock()
+_cloud_logging_is_set_up = False
 
 
-threading.Thread._delete = safe_delete  # type: ignore
+def setup_cloud_logging():
+    """Set up the Cloud Logging client library once per worker process.
 
+    This runs after wrap_wsgi_app() has reloaded the threading module, so
+    the library's background thread is tracked by the reloaded module and
+    needs no work-around when it exits.
+    """
+    global _cloud_logging_is_set_up
+    if _cloud_logging_is_set_up:
+        return
+    with _cloud_logging_lock:
+        if _cloud_logging_is_set_up:
+            return
+        import google.cloud.logging
 
-# Sets up Cloud Logging client library.
-if not settings.UNIT_TEST_MODE and not settings.DEV_MODE:
-    import google.cloud.logging
+        client = google.cloud.logging.Client()
+        client.setup_logging()
+        _cloud_logging_is_set_up = True
 
-    client = google.cloud.logging.Client()
-    client.setup_logging()
 
 # Load in app secrets.
 secrets.load_gemini_api_key()
@@ -104,7 +97,7 @@ secrets.load_ot_api_key()
 # handler might be used for multiple routes that have the field
 # or not.
 
-metrics_chart_routes: list[Route] = [
+metrics_chart_routes: tuple[Route, ...] = (
     Route('/data/timeline/cssanimated', metricsdata.AnimatedTimelineHandler),
     Route(
         '/data/timeline/csspopularity', metricsdata.PopularityTimelineHandler
@@ -126,13 +119,16 @@ metrics_chart_routes: list[Route] = [
         '/data/webfeaturepopularity', metricsdata.WebFeaturePopularityHandler
     ),
     Route('/data/blink/<string:prop_type>', metricsdata.FeatureBucketsHandler),
-]
+)
 
 # TODO(jrobbins): Advance this to v1 once we have it fleshed out
 API_BASE = '/api/v0'
-api_routes: list[Route] = [
+# Routes under this prefix share one branch of the route trie, so the
+# prefix and feature_id are matched once per request.
+FEATURE_API_BASE = f'{API_BASE}/features/<int:feature_id>'
+api_routes: tuple[Route, ...] = (
     Route(f'{API_BASE}/features', features_api.FeaturesAPI),
-    Route(f'{API_BASE}/features/<int:feature_id>', features_api.FeaturesAPI),
+    Route(FEATURE_API_BASE, features_api.FeaturesAPI),
     Route(f'{API_BASE}/features/create', features_api.FeaturesAPI),
     Route(f'{API_BASE}/feature_links', feature_links_api.FeatureLinksAPI),
     Route(
@@ -143,56 +139,32 @@ api_routes: list[Route] = [
         f'{API_BASE}/feature_links_samples',
         feature_links_api.FeatureLinksSamplesAPI,
     ),
-    Route(f'{API_BASE}/features/<int:feature_id>/votes', reviews_api.VotesAPI),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/votes/<int:gate_id>',
-        reviews_api.VotesAPI,
-    ),
-    Route(f'{API_BASE}/features/<int:feature_id>/gates', reviews_api.GatesAPI),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/gates/<int:gate_id>',
-        reviews_api.GatesAPI,
-    ),
+    Route(f'{FEATURE_API_BASE}/votes', reviews_api.VotesAPI),
+    Route(f'{FEATURE_API_BASE}/votes/<int:gate_id>', reviews_api.VotesAPI),
+    Route(f'{FEATURE_API_BASE}/gates', reviews_api.GatesAPI),
+    Route(f'{FEATURE_API_BASE}/gates/<int:gate_id>', reviews_api.GatesAPI),
     Route(f'{API_BASE}/gates/pending', reviews_api.PendingGatesAPI),
+    Route(f'{FEATURE_API_BASE}/approvals/comments', comments_api.CommentsAPI),
     Route(
-        f'{API_BASE}/features/<int:feature_id>/approvals/comments',
-        comments_api.CommentsAPI,
-    ),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/approvals/<int:gate_id>/comments',
+        f'{FEATURE_API_BASE}/approvals/<int:gate_id>/comments',
         comments_api.CommentsAPI,
     ),
+    Route(f'{FEATURE_API_BASE}/attachments', attachments_api.AttachmentsAPI),
+    Route(f'{FEATURE_API_BASE}/process', processes_api.ProcessesAPI),
+    Route(f'{FEATURE_API_BASE}/progress', processes_api.ProgressAPI),
+    Route(f'{FEATURE_API_BASE}/stages', stages_api.StagesAPI),
+    Route(f'{FEATURE_API_BASE}/stages/<int:stage_id>', stages_api.StagesAPI),
     Route(
-        f'{API_BASE}/features/<int:feature_id>/attachments',
-        attachments_api.AttachmentsAPI,
-    ),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/process',
-        processes_api.ProcessesAPI,
-    ),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/progress',
-        processes_api.ProgressAPI,
-    ),
-    Route(f'{API_BASE}/features/<int:feature_id>/stages', stages_api.StagesAPI),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/stages/<int:stage_id>',
-        stages_api.StagesAPI,
-    ),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/stages/<int:stage_id>/addXfnGates',
+        f'{FEATURE_API_BASE}/stages/<int:stage_id>/addXfnGates',
         reviews_api.XfnGatesAPI,
     ),
+    Route(f'{FEATURE_API_BASE}/<int:stage_id>/intent', intents_api.IntentsAPI),
     Route(
-        f'{API_BASE}/features/<int:feature_id>/<int:stage_id>/intent',
-        intents_api.IntentsAPI,
-    ),
-    Route(
-        f'{API_BASE}/features/<int:feature_id>/<int:stage_id>/<int:gate_id>/intent',
+        f'{FEATURE_API_BASE}/<int:stage_id>/<int:gate_id>/intent',
         intents_api.IntentsAPI,
     ),
     Route(
-        f'{API_BASE}/features/<int:feature_id>/wpt-coverage-analysis',
+        f'{FEATURE_API_BASE}/wpt-coverage-analysis',
         wpt_coverage_api.WPTCoverageAPI,
     ),
     # TODO(suzyliu): Remove the "delete" route after the
@@ -280,11 +252,11 @@ api_routes: list[Route] = [
         f'{API_BASE}/milestone-curation/<int:milestone>',
         milestone_curation_api.MilestoneCurationAPI,
     ),
-]
+)
 
 # The Routes below that have no handler specified use SPAHandler.
 # The guide.* handlers each call get_spa_template_data().
-spa_page_routes = [
+spa_page_routes: tuple[Route, ...] = (
     Route('/'),
     Route('/roadmap'),
     # TODO(jrobbins): remove '/myfeatures' after a while.
@@ -395,14 +367,14 @@ spa_page_routes = [
         '/admin/feature_links',
         defaults={'require_admin_site': True, 'require_signin': True},
     ),
-    Route('/admin/slo_report', reminders.SLOReportHandler),
+    Route('/admin/slo_report', 'internals.reminders.SLOReportHandler'),
     Route(
         '/admin/bulk_edit',
         defaults={'require_admin_site': True, 'require_signin': True},
     ),
-]
+)
 
-mpa_page_routes: list[Route] = [
+mpa_page_routes: tuple[Route, ...] = (
     Route('/admin/users/new', users.UserListHandler),
     Route('/admin/ot_requests', ot_requests.OriginTrialsRequests),
     # Note: The only requests being made now hit /features.json and
@@ -432,61 +404,81 @@ mpa_page_routes: list[Route] = [
     ),
     Route('/sitemap.txt', sitemap.SitemapHandler),
     Route('/feature-ssr/<int:feature_id>', featuredetail.FeatureDetailHandler),
-]
+)
 
-internals_routes: list[Route] = [
-    Route('/cron/metrics', fetchmetrics.YesterdayHandler),
-    Route('/cron/histograms', fetchmetrics.HistogramsHandler),
-    Route('/cron/update_blink_components', fetchmetrics.BlinkComponentHandler),
-    Route('/cron/export_backup', data_backup.BackupExportHandler),
+# Handlers given as dotted strings are imported on their first request, so
+# instances that only serve users never load cron, task, or script code.
+internals_routes: tuple[Route, ...] = (
+    Route('/cron/metrics', 'internals.fetchmetrics.YesterdayHandler'),
+    Route('/cron/histograms', 'internals.fetchmetrics.HistogramsHandler'),
     Route(
-        '/cron/send_accuracy_notifications', reminders.FeatureAccuracyHandler
+        '/cron/update_blink_components',
+        'internals.fetchmetrics.BlinkComponentHandler',
+    ),
+    Route('/cron/export_backup', 'internals.data_backup.BackupExportHandler'),
+    Route(
+        '/cron/send_accuracy_notifications',
+        'internals.reminders.FeatureAccuracyHandler',
+    ),
+    Route(
+        '/cron/send_prepublication', 'internals.reminders.PrepublicationHandler'
+    ),
+    Route(
+        '/cron/send_overdue_reviews', 'internals.reminders.SLOOverdueHandler'
     ),
-    Route('/cron/send_prepublication', reminders.PrepublicationHandler),
-    Route('/cron/send_overdue_reviews', reminders.SLOOverdueHandler),
     Route('/cron/warn_inactive_users', notifier.NotifyInactiveUsersHandler),
     Route(
-        '/cron/remove_inactive_users', inactive_users.RemoveInactiveUsersHandler
+        '/cron/remove_inactive_users',
+        'internals.inactive_users.RemoveInactiveUsersHandler',
     ),
     Route('/cron/reindex_all', search_fulltext.ReindexAllFeatures),
     Route(
         '/cron/update_all_feature_links',
         feature_links.UpdateAllFeatureLinksHandlers,
     ),
-    Route('/cron/associate_origin_trials', maintenance_scripts.AssociateOTs),
     Route(
-        '/cron/send-ot-process-reminders', reminders.SendOTReminderEmailsHandler
+        '/cron/associate_origin_trials',
+        'internals.maintenance_scripts.AssociateOTs',
+    ),
+    Route(
+        '/cron/send-ot-process-reminders',
+        'internals.reminders.SendOTReminderEmailsHandler',
     ),
-    Route('/cron/create_origin_trials', maintenance_scripts.CreateOriginTrials),
     Route(
-        '/cron/activate_origin_trials', maintenance_scripts.ActivateOriginTrials
+        '/cron/create_origin_trials',
+        'internals.maintenance_scripts.CreateOriginTrials',
     ),
     Route(
-        '/cron/fetch_webdx_feature_ids', maintenance_scripts.FetchWebdxFeatureId
+        '/cron/activate_origin_trials',
+        'internals.maintenance_scripts.ActivateOriginTrials',
+    ),
+    Route(
+        '/cron/fetch_webdx_feature_ids',
+        'internals.maintenance_scripts.FetchWebdxFeatureId',
     ),
     Route(
         '/cron/generate_review_activities',
-        maintenance_scripts.GenerateReviewActivityFile,
+        'internals.maintenance_scripts.GenerateReviewActivityFile',
     ),
     Route(
         '/cron/generate_stale_features',
-        maintenance_scripts.GenerateStaleFeaturesFile,
+        'internals.maintenance_scripts.GenerateStaleFeaturesFile',
     ),
     Route(
         '/cron/generate_shipping_features',
-        maintenance_scripts.GenerateShippingFeaturesFile,
+        'internals.maintenance_scripts.GenerateShippingFeaturesFile',
     ),
     Route(
         '/cron/reset_stale_shipping_milestones',
-        maintenance_scripts.ResetStaleShippingMilestones,
+        'internals.maintenance_scripts.ResetStaleShippingMilestones',
     ),
     Route(
         '/cron/delete_old_wpt_coverage_report',
-        maintenance_scripts.DeleteWPTCoverageReport,
+        'internals.maintenance_scripts.DeleteWPTCoverageReport',
     ),
     Route('/admin/find_stop_words', search_fulltext.FindStopWords),
     Route('/tasks/email-subscribers', notifier.FeatureChangeHandler),
-    Route('/tasks/detect-intent', detect_intent.IntentEmailHandler),
+    Route('/tasks/detect-intent', 'internals.detect_intent.IntentEmailHandler'),
     Route('/tasks/email-reviewers', notifier.FeatureReviewHandler),
     Route('/tasks/email-assigned', notifier.ReviewAssignmentHandler),
     Route('/tasks/email-comments', notifier.FeatureCommentHandler),
@@ -523,7 +515,7 @@ internals_routes: list[Route] = [
     ),
     Route(
         '/tasks/generate-wpt-coverage-analysis',
-        gemini_helpers.GenerateWPTCoverageEvalReportHandler,
+        'framework.gemini_helpers.GenerateWPTCoverageEvalReportHandler',
     ),
     # OT process reminder emails
     Route(
@@ -548,79 +540,88 @@ internals_routes: list[Route] = [
     ),
     # Maintenance scripts.
     Route(
-        '/scripts/evaluate_gate_status', maintenance_scripts.EvaluateGateStatus
+        '/scripts/evaluate_gate_status',
+        'internals.maintenance_scripts.EvaluateGateStatus',
     ),
     Route(
-        '/scripts/write_missing_gates', maintenance_scripts.WriteMissingGates
+        '/scripts/write_missing_gates',
+        'internals.maintenance_scripts.WriteMissingGates',
     ),
     Route(
         '/scripts/backfill_responded_on',
-        maintenance_scripts.BackfillRespondedOn,
+        'internals.maintenance_scripts.BackfillRespondedOn',
     ),
     Route(
         '/scripts/backfill_stage_created',
-        maintenance_scripts.BackfillStageCreated,
+        'internals.maintenance_scripts.BackfillStageCreated',
     ),
     Route(
         '/scripts/backfill_feature_links',
-        maintenance_scripts.BackfillFeatureLinks,
+        'internals.maintenance_scripts.BackfillFeatureLinks',
     ),
     Route(
         '/scripts/backfill_enterprise_impact',
-        maintenance_scripts.BackfillFeatureEnterpriseImpact,
+        'internals.maintenance_scripts.BackfillFeatureEnterpriseImpact',
     ),
     Route(
         '/scripts/delete_empty_extension_stages',
-        maintenance_scripts.DeleteEmptyExtensionStages,
+        'internals.maintenance_scripts.DeleteEmptyExtensionStages',
     ),
     Route(
         '/scripts/backfill_shipping_year',
-        maintenance_scripts.BackfillShippingYear,
+        'internals.maintenance_scripts.BackfillShippingYear',
     ),
     Route(
         '/scripts/backfill_activity_log_type',
-        maintenance_scripts.BackfillActivityLogType,
+        'internals.maintenance_scripts.BackfillActivityLogType',
     ),
     Route(
-        '/scripts/backfill_gate_dates', maintenance_scripts.BackfillGateDates
+        '/scripts/backfill_gate_dates',
+        'internals.maintenance_scripts.BackfillGateDates',
     ),
     Route(
         '/scripts/send_ot_creation_email/<int:stage_id>',
-        maintenance_scripts.SendManualOTCreatedEmail,
+        'internals.maintenance_scripts.SendManualOTCreatedEmail',
     ),
     Route(
         '/scripts/send_ot_activation_email/<int:stage_id>',
-        maintenance_scripts.SendManualOTActivatedEmail,
+        'internals.maintenance_scripts.SendManualOTActivatedEmail',
     ),
     Route(
         '/scripts/migrate_rollout_milestones',
-        maintenance_scripts.MigrateRolloutMilestones,
+        'internals.maintenance_scripts.MigrateRolloutMilestones',
     ),
     Route(
         '/scripts/reset_outstanding_notifications',
-        maintenance_scripts.ResetOutstandingNotifications,
+        'internals.maintenance_scripts.ResetOutstandingNotifications',
     ),
     Route('/_ah/warmup', basehandlers.WarmupHandler),
-]
+)
 
-dev_routes: list[Route] = []
-if settings.DEV_MODE:
-    dev_routes = [
-        Route('/dev/mock_login', login_api.MockLogin),
-    ]
-# All requests to the app-py3 GAE service are handled by this Flask app.
-app = basehandlers.FlaskApplication(
-    __name__,
-    (
-        metrics_chart_routes
-        + api_routes
-        + mpa_page_routes
-        + spa_page_routes
-        + internals_routes
-        + dev_routes
-    ),
+dev_routes: tuple[Route, ...] = (
+    (Route('/dev/mock_login', login_api.MockLogin),)
+    if settings.DEV_MODE
+    else ()
 )
 
+ALL_ROUTES: tuple[Route, ...] = (
+    *metrics_chart_routes,
+    *api_routes,
+    *mpa_page_routes,
+    *spa_page_routes,
+    *internals_routes,
+    *dev_routes,
+)
+
+# All requests to the app-py3 GAE service are handled by this Flask app.
+app = basehandlers.FlaskApplication(__name__, ALL_ROUTES)
+
+# Cloud Logging is set up on each worker's first request, which on GAE is
+# normally the warmup request, rather than while the worker imports this file.
+# Later requests only check a flag.
+if not settings.UNIT_TEST_MODE and not settings.DEV_MODE:
+    app.before_request(setup_cloud_logging)
+
 # TODO(jrobbins): Make the CSP handler be a class like our others.
 app.add_url_rule('/csp', view_func=csp.report_handler, methods=['POST'])
 
@@ -17,10 +17,17 @@
 
 import testing_config  # isort: split
 
+import importlib
+import re
+import threading
+import time
+from unittest import mock
+
 import flask
 import html5lib
 
 import main
+from api import featurelist_api
 from framework import basehandlers
 
 test_app = flask.Flask(__name__)
@@ -43,6 +50,94 @@ class MainTest(testing_config.CustomTestCase):
         view_func = main.app.view_functions[rule.endpoint]
         self.assertEqual(view_func.view_class, basehandlers.WarmupHandler)
 
+    def test_lazy_handlers_exist(self):
+        """Every handler named by a string is a FlaskHandler we can import."""
+        for route in main.ALL_ROUTES:
+            if not isinstance(route.handler_class, str):
+                continue
+            with self.subTest(path=route.path):
+                module_name, class_name = route.handler_class.rsplit('.', 1)
+                module = importlib.import_module(module_name)
+                handler_class = getattr(module, class_name)
+                self.assertTrue(
+                    issubclass(handler_class, basehandlers.FlaskHandler)
+                )
+                # lazy_view() registers the route with these methods.
+                self.assertEqual(
+                    basehandlers.FlaskHandler.methods, handler_class.methods
+                )
+
+    def assertFastMatch(self, routes):
+        """Check that routes match without werkzeug's regexes."""
+        adapter = main.app.url_map.bind('localhost')
+        with mock.patch(
+            'werkzeug.routing.matcher.StateMachineMatcher.match'
+        ) as mock_match:
+            for route in routes:
+                path = re.sub(r'<int:\w+>', '1', route.path)
+                path = re.sub(r'<(string:)?\w+>', 'css', path)
+                with self.subTest(path=route.path):
+                    rule, values = adapter.match(path, 'GET', return_rule=True)
+                    self.assertEqual(route.path, rule.rule)
+                    for name in re.findall(r'<int:(\w+)>', route.path):
+                        self.assertEqual(1, values[name])
+        mock_match.assert_not_called()
+
+    def test_metrics_routes_use_fast_matcher(self):
+        """The /data and /metrics routes match without werkzeug's regexes."""
+        self.assertFastMatch(
+            main.metrics_chart_routes
+            + tuple(
+                r for r in main.spa_page_routes if r.path.startswith('/metrics')
+            )
+        )
+
+    def test_api_routes_use_fast_matcher(self):
+        """The API routes match and convert int params in our matcher."""
+        self.assertFastMatch(main.api_routes)
+
+    def test_features_json_routes_use_static_lookup(self):
+        """The polled JSON feeds are exact dict lookups, with no regexes."""
+        matcher = main.app.url_map._matcher
+        for path in ('/features.json', '/features_v2.json'):
+            with self.subTest(path=path):
+                rule = matcher.static_rules[path, 'GET']
+                view_func = main.app.view_functions[rule.endpoint]
+                self.assertEqual(
+                    featurelist_api.FeaturesJsonHandler, view_func.view_class
+                )
+        self.assertFastMatch(
+            [r for r in main.mpa_page_routes if r.path.endswith('.json')]
+        )
+
+    @mock.patch('main._cloud_logging_is_set_up', False)
+    @mock.patch('google.cloud.logging.Client')
+    def test_setup_cloud_logging(self, mock_client):
+        """Cloud Logging is set up only once per worker process."""
+        main.setup_cloud_logging()
+        main.setup_cloud_logging()
+
+        mock_client.assert_called_once_with()
+        mock_client.return_value.setup_logging.assert_called_once_with()
+
+    @mock.patch('main._cloud_logging_is_set_up', False)
+    @mock.patch('google.cloud.logging.Client')
+    def test_setup_cloud_logging__concurrent(self, mock_client):
+        """Concurrent first requests set up Cloud Logging only once."""
+        mock_client.return_value.setup_logging.side_effect = lambda: time.sleep(
+            0.05
+        )
+        threads = [
+            threading.Thread(target=main.setup_cloud_logging) for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_client.assert_called_once_with()
+        mock_client.return_value.setup_logging.assert_called_once_with()
+
     def test_warmup_handler(self):
         """Verify that WarmupHandler returns OK."""
         handler = basehandlers.WarmupHandler()
@@ -92,6 +92,9 @@ MAX_ATTACHMENT_SIZE = 1 * 1024 * 1024
 # Largest overall POST to any handler.
 MAX_REQUEST_CONTENT_LENGTH = 16 * 1024 * 1024
 
+# Number of recently matched URL paths that each worker remembers.
+ROUTE_CACHE_SIZE = 1024
+
 # Origin trials API URL
 OT_URL = 'https://origintrials-staging.corp.google.com/origintrials/'
 OT_API_URL = 'https://staging-chromeorigintrials-pa.sandbox.googleapis.com'
@@ -101,9 +101,11 @@ class CustomTestCase(unittest.TestCase):
     def run(self, result=None):
         """Runs the test case, managing the context for NDB and clearing caches."""
         from framework import rediscache
+        from internals import approval_defs
 
         if rediscache.redis_client:
             rediscache.redis_client.flushall()
+        approval_defs.clear_local_caches()
         sign_out()
         client = ndb.Client()
         with client.context():